@@ -0,0 +1,86 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Compiled versions of the chunk and pipe parsers in ingest.py.
+
+Build in place from this directory with:
+    python setup.py build_ext --inplace
+ingest.py uses these when the module imports and falls back to its
+iter_chunks_py / extract_pipe_delimited_py otherwise; the two must agree.
+
+Rather than slicing a substring and then strip()-ing a second copy, both
+functions find field bounds by index over the decoded text (whitespace
+skipped with Py_UNICODE_ISSPACE, as str.strip does) and slice each field
+exactly once.
+"""
+
+from cpython.unicode cimport (
+    Py_UNICODE_ISSPACE,
+    PyUnicode_Find,
+    PyUnicode_FindChar,
+    PyUnicode_Substring,
+)
+
+cdef inline Py_ssize_t _lstrip(str text, Py_ssize_t start, Py_ssize_t end):
+    while start < end and Py_UNICODE_ISSPACE(text[start]):
+        start += 1
+    return start
+
+cdef inline Py_ssize_t _rstrip(str text, Py_ssize_t start, Py_ssize_t end):
+    while end > start and Py_UNICODE_ISSPACE(text[end - 1]):
+        end -= 1
+    return end
+
+cdef inline str _stripped(str text, Py_ssize_t start, Py_ssize_t end):
+    start = _lstrip(text, start, end)
+    return PyUnicode_Substring(text, start, _rstrip(text, start, end))
+
+def iter_chunks(str text, Py_ssize_t chunk_size, Py_ssize_t overlap):
+    cdef Py_ssize_t step = chunk_size - overlap
+    cdef Py_ssize_t n = len(text)
+    cdef Py_ssize_t start = 0
+    cdef Py_ssize_t s, e
+
+    if step == 0:
+        raise ValueError("range() arg 3 must not be zero")
+
+    while step > 0 and start < n:
+        e = start + chunk_size if start + chunk_size < n else n
+        s = _lstrip(text, start, e)
+        e = _rstrip(text, s, e)
+        if s < e:
+            yield PyUnicode_Substring(text, s, e)
+        start += step
+
+cpdef list extract_pipe_delimited(str text):
+    cdef list entries = []
+    cdef Py_ssize_t n = len(text)
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t eol, s, e, sep, sep2, topic_end
+    cdef object topic
+
+    while pos <= n:
+        eol = PyUnicode_FindChar(text, '\n', pos, n, 1)
+        if eol == -1:
+            eol = n
+        s = _lstrip(text, pos, eol)
+        e = _rstrip(text, s, eol)
+        pos = eol + 1
+
+        sep = PyUnicode_Find(text, ' | ', s, e, 1)
+        if sep == -1:
+            continue
+
+        sep2 = PyUnicode_Find(text, ' | ', sep + 3, e, 1)
+        if sep2 == -1:
+            sep2 = e
+            topic = None
+        else:
+            # Fields past the third are ignored
+            topic_end = PyUnicode_Find(text, ' | ', sep2 + 3, e, 1)
+            topic = _stripped(text, sep2 + 3, e if topic_end == -1 else topic_end)
+
+        entries.append({
+            'thinker': _stripped(text, s, sep),
+            'content': _stripped(text, sep + 3, sep2),
+            'topic': topic
+        })
+    return entries
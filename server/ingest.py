@@ -1,7 +1,21 @@
+import argparse
+import json
 import os
 import psycopg2
+from psycopg2 import errors, sql
+from psycopg2.extras import execute_values
 from datetime import datetime
 import re
+import threading
+from functools import lru_cache
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+# Compiled parsers from _ingest_parse.pyx, if built (see setup.py)
+try:
+    import _ingest_parse
+except ImportError:
+    _ingest_parse = None
 
 # INGESTION FOLDER: Drop files here with naming convention:
 # - Works:     author_works_n.txt     (e.g., kuczynski_works_1.txt)
@@ -10,6 +24,28 @@ import re
 INGEST_FOLDER = "data/ingest"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
+INGEST_WORKERS = 8
+WORKS_STREAM_THRESHOLD = 16 * 1024 * 1024  # Stream works larger than this via COPY
+STREAM_READ_SIZE = 1 << 20
+CHUNK_BATCH_SIZE = 1000  # Chunks per COPY; a failing batch only loses itself
+BULK_TABLES = ['text_chunks', 'positions', 'quotes', 'arguments']
+
+# Argument markdown patterns (see extract_arguments). _BLOCK_RE finds each
+# argument in one scan. _FIELD_RE then walks each body once; every field is
+# captured inside a lookahead, so fields may overlap or come in any order and
+# still each resolve to their first occurrence, as separate searches would.
+_ARG_HEADER = r'###\s*Argument\s+\d+\s*\('
+_BLOCK_RE = re.compile(
+    _ARG_HEADER + r'(?P<type>[^)]+)\)(?P<body>.*?)(?=' + _ARG_HEADER + r'[^)]+\)|\Z)',
+    re.DOTALL)
+_FIELD_RE = re.compile(
+    r'(?=\*\*Author:\*\*\s*(?P<author>\w+)'
+    r'|\*\*Premises:\*\*(?P<premises>.*?)(?:\*\*→|$)'
+    r'|\*\*→\s*Conclusion:\*\*\s*(?P<conclusion>.+?)(?:\n\n|\*Source|$)'
+    r'|\*Source:\s*(?P<source>[^|]+)'
+    r'|Importance:\s*(?P<importance>\d+)/10)',
+    re.DOTALL)
+_PREMISE_LINE_RE = re.compile(r'^-\s*(.+)$', re.MULTILINE)
 
 def get_db_connection():
     database_url = os.environ.get("DATABASE_URL")
@@ -17,6 +53,55 @@ def get_db_connection():
         raise Exception("DATABASE_URL not found in environment variables")
     return psycopg2.connect(database_url)
 
+def get_ingest_connection():
+    """Open a connection for bulk ingest with synchronous_commit off.
+
+    COMMIT then returns without waiting for the WAL flush. If the database
+    server crashes, the last fraction of a second of commits can be lost
+    even though their files were already deleted; re-drop those files.
+    """
+    conn = get_db_connection()
+    with conn.cursor() as c:
+        c.execute("SET synchronous_commit TO off")
+    conn.commit()
+    return conn
+
+# One connection per ingest worker thread, reused across the files it handles
+_thread_state = threading.local()
+_thread_conns = []
+_thread_conns_lock = threading.Lock()
+
+def get_thread_connection():
+    conn = getattr(_thread_state, 'conn', None)
+    if conn is not None and conn.closed:
+        discard_thread_connection()
+        conn = None
+    if conn is None:
+        conn = get_ingest_connection()
+        _thread_state.conn = conn
+        with _thread_conns_lock:
+            _thread_conns.append(conn)
+    return conn
+
+def discard_thread_connection():
+    """Forget this thread's connection (e.g. after the server dropped it) so
+    the next file opens a fresh one"""
+    conn = getattr(_thread_state, 'conn', None)
+    _thread_state.conn = None
+    if conn is None:
+        return
+    with _thread_conns_lock:
+        if conn in _thread_conns:
+            _thread_conns.remove(conn)
+    if not conn.closed:
+        conn.close()
+
+def close_thread_connections():
+    with _thread_conns_lock:
+        while _thread_conns:
+            _thread_conns.pop().close()
+
+@lru_cache(maxsize=4096)
 def parse_filename(filename):
     name = filename.rsplit('.', 1)[0]
     if '_' not in name:
@@ -25,6 +110,21 @@ def parse_filename(filename):
     thinker = parts[0].lower()
     return thinker
 
+def chunk_source_name(filename):
+    """Source label for a chunks file: author_some_source.txt -> some_source"""
+    name = filename.rsplit('.', 1)[0]
+    parts = name.split('_', 1)
+    return parts[1] if len(parts) > 1 else name
+
+def work_title(filename):
+    """Clean title for a works file: author_works_n_title.txt -> title"""
+    name = filename.rsplit('.', 1)[0]
+    parts = name.split('_')
+    # Remove author and 'works' and number, keep rest as title
+    title_parts = [p for p in parts[2:] if not p.isdigit()]
+    return ' '.join(title_parts) if title_parts else name
+
+@lru_cache(maxsize=4096)
 def get_file_type(filename):
     lower = filename.lower()
     if '_positions_' in lower:
@@ -38,92 +138,160 @@ def get_file_type(filename):
     else:
         return 'chunks'
 
+def advise_sequential(f):
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+def drop_from_page_cache(f):
+    # The file is deleted once ingested, so its cached pages are dead weight
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+def decode_text(data, errors='strict'):
+    """Decode a whole file in one go, with the newline translation text mode
+    would have done but without its incremental decoder"""
+    text = data.decode('utf-8', errors)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+def read_text_file(filepath, errors='strict'):
+    """Read a whole ingest file as UTF-8 in one read and one decode, leaving
+    nothing behind in the page cache"""
+    with open(filepath, 'rb') as f:
+        advise_sequential(f)
+        data = f.read()
+        drop_from_page_cache(f)
+    return decode_text(data, errors)
+
+def iter_chunks(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    if _ingest_parse is not None:
+        return _ingest_parse.iter_chunks(text, chunk_size, overlap)
+    return iter_chunks_py(text, chunk_size, overlap)
+
+def iter_chunks_py(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    step = chunk_size - overlap
+    for start in range(0, len(text), step):
+        chunk = text[start:start + chunk_size].strip()
+        if chunk:
+            yield chunk
+
 def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk.strip())
-        start = end - overlap
-    return [c for c in chunks if c]
+    return list(iter_chunks(text, chunk_size, overlap))
+
+def copy_field(value):
+    """Format a value for COPY ... FROM STDIN WITH (FORMAT text)"""
+    if value is None:
+        return '\\N'
+    value = str(value)
+    return (value.replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
+
+class CopyStream:
+    """Read-only file object over an iterator of COPY text pieces, so
+    copy_expert can pull a row in bounded chunks instead of one big string"""
+
+    def __init__(self, pieces):
+        self._pieces = iter(pieces)
+        self._buf = ''
+        self._pos = 0
+
+    def read(self, size=-1):
+        parts = []
+        remaining = size
+        while size < 0 or remaining > 0:
+            if self._pos >= len(self._buf):
+                piece = next(self._pieces, None)
+                if piece is None:
+                    break
+                self._buf = piece
+                self._pos = 0
+                continue
+            end = len(self._buf) if size < 0 else self._pos + remaining
+            data = self._buf[self._pos:end]
+            self._pos += len(data)
+            remaining -= len(data)
+            parts.append(data)
+        return ''.join(parts)
 
 def extract_pipe_delimited(text):
     """Extract pipe-delimited entries: thinker | content | topic"""
-    lines = text.split('\n')
+    if _ingest_parse is not None:
+        return _ingest_parse.extract_pipe_delimited(text)
+    return extract_pipe_delimited_py(text)
+
+def extract_pipe_delimited_py(text):
     entries = []
 
-    for line in lines:
-        line = line.strip()
-        if not line or ' | ' not in line:
+    # Only '\n' ends a record (decode_text has already folded \r\n and \r);
+    # splitlines() would also break on form feeds and other separators
+    for line in text.split('\n'):
+        # partition returns a fixed 3-tuple, so no per-line list is built
+        thinker, sep, rest = line.strip().partition(' | ')
+        if not sep:
             continue
 
-        parts = line.split(' | ')
-        if len(parts) >= 2:
-            thinker = parts[0].strip()
-            content = parts[1].strip()
-            topic = parts[2].strip() if len(parts) >= 3 else None
-            entries.append({
-                'thinker': thinker,
-                'content': content,
-                'topic': topic
-            })
+        content, sep, topic = rest.partition(' | ')
+        entries.append({
+            'thinker': thinker.strip(),
+            'content': content.strip(),
+            # Fields past the third are ignored, as with split(' | ')
+            'topic': topic.partition(' | ')[0].strip() if sep else None
+        })
 
     return entries
 
-def ingest_positions_file(filepath, conn):
+def ingest_positions_file(filepath, conn, thinker_from_filename):
     filename = os.path.basename(filepath)
     print(f"Processing POSITIONS: {filename}")
-    thinker_from_filename = parse_filename(filename)
-    print(f"  Thinker (from filename): {thinker_from_filename}")
+    print(f"  [{filename}] Thinker (from filename): {thinker_from_filename}")
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        text = f.read()
+    text = read_text_file(filepath)
 
     entries = extract_pipe_delimited(text)
-    print(f"  Positions found: {len(entries)}")
+    print(f"  [{filename}] Positions found: {len(entries)}")
 
-    cursor = conn.cursor()
-    for e in entries:
-        thinker = e.get('thinker') or thinker_from_filename
-        cursor.execute("""
+    now = datetime.now()
+    rows = [(e.get('thinker') or thinker_from_filename, e['content'], e['topic'], now) for e in entries]
+
+    with conn.cursor() as cursor:
+        execute_values(cursor, """
             INSERT INTO positions (thinker, position_text, topic, created_at)
-            VALUES (%s, %s, %s, %s)
-        """, (thinker, e['content'], e['topic'], datetime.now()))
+            VALUES %s
+        """, rows, page_size=1000)
 
     conn.commit()
-    cursor.close()
-    print(f"  Inserted {len(entries)} positions into database.")
+    print(f"  [{filename}] Inserted {len(entries)} positions into database.")
 
     os.remove(filepath)
-    print(f"  Deleted: {filename}")
+    print(f"  [{filename}] Deleted.")
 
-def ingest_quotes_file(filepath, conn):
+def ingest_quotes_file(filepath, conn, thinker_from_filename):
     filename = os.path.basename(filepath)
     print(f"Processing QUOTES: {filename}")
-    thinker_from_filename = parse_filename(filename)
-    print(f"  Thinker (from filename): {thinker_from_filename}")
+    print(f"  [{filename}] Thinker (from filename): {thinker_from_filename}")
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        text = f.read()
+    text = read_text_file(filepath)
 
     entries = extract_pipe_delimited(text)
-    print(f"  Quotes found: {len(entries)}")
+    print(f"  [{filename}] Quotes found: {len(entries)}")
 
-    cursor = conn.cursor()
-    for e in entries:
-        thinker = e.get('thinker') or thinker_from_filename
-        cursor.execute("""
+    now = datetime.now()
+    rows = [(e.get('thinker') or thinker_from_filename, e['content'], e['topic'], now) for e in entries]
+
+    with conn.cursor() as cursor:
+        execute_values(cursor, """
             INSERT INTO quotes (thinker, quote_text, topic, created_at)
-            VALUES (%s, %s, %s, %s)
-        """, (thinker, e['content'], e['topic'], datetime.now()))
+            VALUES %s
+        """, rows, page_size=1000)
 
     conn.commit()
-    cursor.close()
-    print(f"  Inserted {len(entries)} quotes into database.")
+    print(f"  [{filename}] Inserted {len(entries)} quotes into database.")
 
     os.remove(filepath)
-    print(f"  Deleted: {filename}")
+    print(f"  [{filename}] Deleted.")
 
 def extract_arguments(text):
     """Extract argument entries from markdown format:
@@ -135,42 +303,28 @@ def extract_arguments(text):
     **→ Conclusion:** conclusion text
     *Source: topic | Importance: N/10*
     """
-    import json
-    import re
     entries = []
-    
-    # Split by argument headers
-    argument_blocks = re.split(r'###\s*Argument\s+\d+\s*\(([^)]+)\)', text)
-    
-    # First element is preamble, then alternating: type, content, type, content...
-    i = 1
-    while i < len(argument_blocks) - 1:
-        argument_type = argument_blocks[i].strip().lower()
-        block = argument_blocks[i + 1]
-        i += 2
-        
-        # Extract author
-        author_match = re.search(r'\*\*Author:\*\*\s*(\w+)', block)
-        thinker = author_match.group(1).lower() if author_match else None
-        
-        # Extract premises (lines starting with -)
-        premises_section = re.search(r'\*\*Premises:\*\*(.*?)(?:\*\*→|$)', block, re.DOTALL)
+
+    for block in _BLOCK_RE.finditer(text):
+        argument_type = block.group('type').strip().lower()
+
+        # Keep the first occurrence of each field
+        fields = {}
+        for m in _FIELD_RE.finditer(block.group('body')):
+            fields.setdefault(m.lastgroup, m.group(m.lastgroup))
+
+        thinker = fields['author'].lower() if 'author' in fields else None
+
+        # Premises are the lines starting with - in the premises section
         premises = []
-        if premises_section:
-            premise_lines = re.findall(r'^-\s*(.+)$', premises_section.group(1), re.MULTILINE)
+        if 'premises' in fields:
+            premise_lines = _PREMISE_LINE_RE.findall(fields['premises'])
             premises = [p.strip() for p in premise_lines if p.strip()]
-        
-        # Extract conclusion
-        conclusion_match = re.search(r'\*\*→\s*Conclusion:\*\*\s*(.+?)(?:\n\n|\*Source|$)', block, re.DOTALL)
-        conclusion = conclusion_match.group(1).strip() if conclusion_match else ''
-        
-        # Extract source/topic and importance
-        source_match = re.search(r'\*Source:\s*([^|]+)', block)
-        topic = source_match.group(1).strip() if source_match else None
-        
-        importance_match = re.search(r'Importance:\s*(\d+)/10', block)
-        importance = int(importance_match.group(1)) if importance_match else 5
-        
+
+        conclusion = fields.get('conclusion', '').strip()
+        topic = fields['source'].strip() if 'source' in fields else None
+        importance = int(fields['importance']) if 'importance' in fields else 5
+
         if premises and conclusion:
             entries.append({
                 'thinker': thinker,
@@ -183,138 +337,268 @@ def extract_arguments(text):
     
     return entries
 
-def ingest_arguments_file(filepath, conn):
+def ingest_arguments_file(filepath, conn, thinker_from_filename):
     filename = os.path.basename(filepath)
     print(f"Processing ARGUMENTS: {filename}")
-    thinker_from_filename = parse_filename(filename)
-    print(f"  Thinker (from filename): {thinker_from_filename}")
+    print(f"  [{filename}] Thinker (from filename): {thinker_from_filename}")
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        text = f.read()
+    text = read_text_file(filepath)
 
     entries = extract_arguments(text)
-    print(f"  Arguments found: {len(entries)}")
+    print(f"  [{filename}] Arguments found: {len(entries)}")
 
-    cursor = conn.cursor()
-    for e in entries:
-        thinker = e.get('thinker') or thinker_from_filename
-        cursor.execute("""
+    now = datetime.now()
+    rows = [(e.get('thinker') or thinker_from_filename, e['argument_type'], e['premises'],
+             e['conclusion'], e['topic'], e['importance'], now) for e in entries]
+
+    with conn.cursor() as cursor:
+        execute_values(cursor, """
             INSERT INTO arguments (thinker, argument_type, premises, conclusion, topic, importance, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (thinker, e['argument_type'], e['premises'], e['conclusion'], e['topic'], e['importance'], datetime.now()))
+            VALUES %s
+        """, rows, page_size=1000)
 
     conn.commit()
-    cursor.close()
-    print(f"  Inserted {len(entries)} arguments into database.")
+    print(f"  [{filename}] Inserted {len(entries)} arguments into database.")
 
     os.remove(filepath)
-    print(f"  Deleted: {filename}")
+    print(f"  [{filename}] Deleted.")
 
-def ingest_chunks_file(filepath, conn):
+def log_bad_batch(filename, first_index, size, error):
+    last_index = first_index + size - 1
+    print(f"  [{filename}] ERROR: chunks {first_index}-{last_index} were not inserted: {error}")
+
+def ingest_chunks_file(filepath, conn, thinker):
     filename = os.path.basename(filepath)
     print(f"Processing CHUNKS: {filename}")
-    thinker = parse_filename(filename)
-    name = filename.rsplit('.', 1)[0]
-    parts = name.split('_', 1)
-    source_file = parts[1] if len(parts) > 1 else name
-    print(f"  Thinker: {thinker}")
-    print(f"  Source: {source_file}")
-
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        text = f.read()
-
-    chunks = chunk_text(text)
-    print(f"  Chunks: {len(chunks)}")
-
-    cursor = conn.cursor()
-    for index, chunk_text_content in enumerate(chunks):
-        cursor.execute("""
-            INSERT INTO text_chunks (thinker, source_file, chunk_text, chunk_index, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (thinker, source_file, chunk_text_content, index, datetime.now()))
+    source_file = chunk_source_name(filename)
+    print(f"  [{filename}] Thinker: {thinker}")
+    print(f"  [{filename}] Source: {source_file}")
+
+    text = read_text_file(filepath, errors='ignore')
+
+    # Stream chunks through COPY in batches of CHUNK_BATCH_SIZE rows instead of
+    # one INSERT per row; chunks are generated as they are sent, so they never
+    # all exist at once. Each batch runs under a savepoint so a bad one
+    # (odd text the server rejects) is skipped without losing the rest.
+    now = copy_field(datetime.now())
+    prefix = f"{copy_field(thinker)}\t{copy_field(source_file)}\t"
+    rows = (f"{prefix}{copy_field(chunk_text_content)}\t{index}\t{now}\n"
+            for index, chunk_text_content in enumerate(iter_chunks(text)))
+    inserted = 0
+    present = 0
+    skipped = 0
+
+    with conn.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, CHUNK_BATCH_SIZE))
+            if not batch:
+                break
+
+            cursor.execute("SAVEPOINT chunk_batch")
+            try:
+                cursor.copy_expert("""
+                    COPY text_chunks (thinker, source_file, chunk_text, chunk_index, created_at)
+                    FROM STDIN WITH (FORMAT text)
+                """, CopyStream(batch), size=STREAM_READ_SIZE)
+                cursor.execute("RELEASE SAVEPOINT chunk_batch")
+            except errors.UniqueViolation:
+                # UNIQUE(thinker, source_file, chunk_index): this batch was stored
+                # by an earlier run. Batches cover fixed chunk_index ranges and
+                # COPY is all-or-nothing, so the whole batch is already there.
+                cursor.execute("ROLLBACK TO SAVEPOINT chunk_batch")
+                present += len(batch)
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT chunk_batch")
+                log_bad_batch(filename, inserted + present + skipped, len(batch), e)
+                skipped += len(batch)
+            else:
+                inserted += len(batch)
+
+    # Every batch that wasn't already stored failed: fail the file so the
+    # worker rolls back and reports it
+    if skipped and not inserted:
+        raise Exception(f"{skipped} chunks failed to insert and none were new; file kept")
 
     conn.commit()
-    cursor.close()
-    print(f"  Inserted {len(chunks)} chunks into database.")
+    print(f"  [{filename}] Inserted {inserted} chunks into database.")
+    if present:
+        print(f"  [{filename}] {present} chunks were already stored.")
+
+    # Keep a partially ingested file so the failed batches aren't lost; a
+    # re-run finds the stored batches present and retries only the rest
+    if skipped:
+        print(f"  [{filename}] Skipped {skipped} chunks in failed batches; file kept for re-ingest.")
+        return
 
     os.remove(filepath)
-    print(f"  Deleted: {filename}")
+    print(f"  [{filename}] Deleted.")
+
+def iter_work_copy_row(f, thinker, title, source_file, created_at):
+    """Yield one COPY text-format row for the texts table, reading content from f"""
+    yield f"{copy_field(thinker)}\t{copy_field(title)}\t{copy_field(source_file)}\t"
+    for block in iter(lambda: f.read(STREAM_READ_SIZE), ''):
+        yield copy_field(block)
+    yield f"\t{copy_field(created_at)}\n"
 
-def ingest_works_file(filepath, conn):
+def ingest_works_file(filepath, conn, thinker):
     """Ingest full works/texts into the texts table"""
     filename = os.path.basename(filepath)
     print(f"Processing WORKS: {filename}")
-    thinker = parse_filename(filename)
-    
-    # Extract title from filename: author_works_n.txt -> clean title
-    name = filename.rsplit('.', 1)[0]
-    parts = name.split('_')
-    # Remove author and 'works' and number, keep rest as title
-    title_parts = [p for p in parts[2:] if not p.isdigit()]
-    title = ' '.join(title_parts) if title_parts else name
-    
-    print(f"  Thinker: {thinker}")
-    print(f"  Title: {title}")
-
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
+    title = work_title(filename)
+    print(f"  [{filename}] Thinker: {thinker}")
+    print(f"  [{filename}] Title: {title}")
+
+    now = datetime.now()
+    file_size = os.path.getsize(filepath)
+
+    if file_size > WORKS_STREAM_THRESHOLD:
+        # Very large work: feed the content to COPY in STREAM_READ_SIZE pieces
+        # so the whole book is never held in memory
+        print(f"  [{filename}] Content length: {file_size} bytes (streaming)")
+        with open(filepath, 'r', encoding='utf-8', errors='ignore', buffering=STREAM_READ_SIZE) as f:
+            advise_sequential(f)
+            with conn.cursor() as cursor:
+                cursor.copy_expert("""
+                    COPY texts (thinker, title, source_file, content, created_at)
+                    FROM STDIN WITH (FORMAT text)
+                """, CopyStream(iter_work_copy_row(f, thinker, title, filename, now)), size=STREAM_READ_SIZE)
+            drop_from_page_cache(f)
+    else:
+        content = read_text_file(filepath, errors='ignore')
 
-    print(f"  Content length: {len(content)} characters")
+        print(f"  [{filename}] Content length: {len(content)} characters")
 
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO texts (thinker, title, source_file, content, created_at)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (thinker, title, filename, content, datetime.now()))
+        # Single row: a plain INSERT is already one round trip, and COPY would
+        # mean escaping the whole book in Python first
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO texts (thinker, title, source_file, content, created_at)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (thinker, title, filename, content, now))
 
     conn.commit()
-    cursor.close()
-    print(f"  Inserted work '{title}' into texts table.")
+    print(f"  [{filename}] Inserted work '{title}' into texts table.")
 
     os.remove(filepath)
-    print(f"  Deleted: {filename}")
+    print(f"  [{filename}] Deleted.")
 
 def ingest_file(filepath, conn):
     filename = os.path.basename(filepath)
     file_type = get_file_type(filename)
+    thinker = parse_filename(filename)
 
     if file_type == 'positions':
-        ingest_positions_file(filepath, conn)
+        ingest_positions_file(filepath, conn, thinker)
     elif file_type == 'quotes':
-        ingest_quotes_file(filepath, conn)
+        ingest_quotes_file(filepath, conn, thinker)
     elif file_type == 'works':
-        ingest_works_file(filepath, conn)
+        ingest_works_file(filepath, conn, thinker)
     elif file_type == 'arguments':
-        ingest_arguments_file(filepath, conn)
+        ingest_arguments_file(filepath, conn, thinker)
     else:
-        ingest_chunks_file(filepath, conn)
+        ingest_chunks_file(filepath, conn, thinker)
+
+def drop_secondary_indexes(conn, dropped, tables=BULK_TABLES):
+    """Drop the non-unique indexes on tables that don't back a constraint
+    (uniqueness must hold during the load). Each definition is appended to
+    dropped as soon as its drop succeeds, so a failure partway still leaves
+    the caller everything it has to rebuild. conn must be in autocommit mode
+    (DROP ... CONCURRENTLY)."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT i.schemaname, i.indexname, i.indexdef
+            FROM pg_indexes i
+            JOIN pg_index x ON x.indexrelid = format('%%I.%%I', i.schemaname, i.indexname)::regclass
+            WHERE i.tablename = ANY(%s::name[])
+              AND i.schemaname = ANY(current_schemas(false))
+              AND NOT x.indisunique
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_constraint c
+                  WHERE c.conindid = format('%%I.%%I', i.schemaname, i.indexname)::regclass
+              )
+        """, (tables,))
+        indexes = cursor.fetchall()
+
+        for schema, name, indexdef in indexes:
+            # Print the definition first so it can be restored by hand if we die
+            print(f"Dropping index: {indexdef}")
+            cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(schema, name)))
+            dropped.append(indexdef)
+
+def recreate_indexes(conn, indexdefs):
+    with conn.cursor() as cursor:
+        for indexdef in indexdefs:
+            print(f"Rebuilding index: {indexdef}")
+            try:
+                cursor.execute(indexdef)
+            except psycopg2.Error as e:
+                print(f"  ERROR: {e}")
+
+def ingest_worker(filepath):
+    # Files run concurrently, so every report line carries its [filename]
+    conn = None
+    try:
+        conn = get_thread_connection()
+        ingest_file(filepath, conn)
+    except Exception as e:
+        print(f"  [{os.path.basename(filepath)}] ERROR: {e}")
+        if conn is None:
+            return
+        # Reset transaction state so next file can proceed; a connection that
+        # died can't be rolled back, so replace it instead
+        if conn.closed:
+            discard_thread_connection()
+            return
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            discard_thread_connection()
 
 def main():
+    parser = argparse.ArgumentParser(description=f"Ingest the files dropped in {INGEST_FOLDER}")
+    parser.add_argument('--bulk', action='store_true',
+                        help="drop secondary indexes on the ingest tables for the load and rebuild them after; "
+                             "faster for large batches, but queries are slow until the rebuild finishes")
+    args = parser.parse_args()
+
     if not os.path.exists(INGEST_FOLDER):
         print(f"Creating ingest folder: {INGEST_FOLDER}")
         os.makedirs(INGEST_FOLDER)
         print("Drop files here and run this script again.")
         return
 
-    files = [f for f in os.listdir(INGEST_FOLDER) if '_' in f]
-    if not files:
+    # DirEntry caches the type from the directory read, so no extra stat per file
+    with os.scandir(INGEST_FOLDER) as it:
+        filepaths = [e.path for e in it if e.is_file() and '_' in e.name]
+    if not filepaths:
         print(f"No files found in {INGEST_FOLDER}")
         return
 
-    print(f"Found {len(files)} file(s) to process.\n")
-    conn = get_db_connection()
-
-    for filename in files:
-        filepath = os.path.join(INGEST_FOLDER, filename)
-        try:
-            ingest_file(filepath, conn)
-            print()
-        except Exception as e:
-            print(f"  ERROR: {e}")
-            conn.rollback()  # Reset transaction state so next file can proceed
+    print(f"Found {len(filepaths)} file(s) to process.\n")
+
+    # One sorted index build after the load is much cheaper than
+    # maintaining every index row by row during it
+    admin_conn = None
+    indexdefs = []
+    if args.bulk:
+        admin_conn = get_db_connection()
+        admin_conn.autocommit = True
+
+    # Ingest is dominated by file reads and DB round trips, both of which
+    # release the GIL, so several files can be in flight at once
+    try:
+        if admin_conn is not None:
+            drop_secondary_indexes(admin_conn, indexdefs)
             print()
-
-    conn.close()
+        with ThreadPoolExecutor(max_workers=min(INGEST_WORKERS, len(filepaths))) as executor:
+            list(executor.map(ingest_worker, filepaths))
+    finally:
+        close_thread_connections()
+        if admin_conn is not None:
+            try:
+                recreate_indexes(admin_conn, indexdefs)
+            finally:
+                admin_conn.close()
 
     print("Done.")
 
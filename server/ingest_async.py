@@ -0,0 +1,144 @@
+import asyncio
+import os
+from datetime import datetime
+
+import aiofiles
+import asyncpg
+
+from ingest import (
+    INGEST_FOLDER,
+    INGEST_WORKERS,
+    STREAM_READ_SIZE,
+    WORKS_STREAM_THRESHOLD,
+    chunk_source_name,
+    chunk_text,
+    copy_field,
+    decode_text,
+    extract_arguments,
+    extract_pipe_delimited,
+    get_file_type,
+    parse_filename,
+    work_title,
+)
+
+# Async variant of ingest.py: same folder and naming convention, but file reads
+# and database COPYs for several files overlap on one event loop. Rows are loaded
+# with asyncpg's copy_records_to_table (binary COPY).
+
+async def read_file(filepath, errors='strict'):
+    async with aiofiles.open(filepath, 'rb') as f:
+        return decode_text(await f.read(), errors)
+
+async def copy_records(pool, table, columns, records):
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.copy_records_to_table(table, records=records, columns=columns)
+
+async def ingest_positions_file(filepath, pool, thinker_from_filename):
+    entries = extract_pipe_delimited(await read_file(filepath))
+    now = datetime.now()
+    await copy_records(pool, 'positions', ['thinker', 'position_text', 'topic', 'created_at'],
+                       [(e.get('thinker') or thinker_from_filename, e['content'], e['topic'], now) for e in entries])
+    return f"{len(entries)} positions"
+
+async def ingest_quotes_file(filepath, pool, thinker_from_filename):
+    entries = extract_pipe_delimited(await read_file(filepath))
+    now = datetime.now()
+    await copy_records(pool, 'quotes', ['thinker', 'quote_text', 'topic', 'created_at'],
+                       [(e.get('thinker') or thinker_from_filename, e['content'], e['topic'], now) for e in entries])
+    return f"{len(entries)} quotes"
+
+async def ingest_arguments_file(filepath, pool, thinker_from_filename):
+    entries = extract_arguments(await read_file(filepath))
+    now = datetime.now()
+    await copy_records(pool, 'arguments',
+                       ['thinker', 'argument_type', 'premises', 'conclusion', 'topic', 'importance', 'created_at'],
+                       [(e.get('thinker') or thinker_from_filename, e['argument_type'], e['premises'],
+                         e['conclusion'], e['topic'], e['importance'], now) for e in entries])
+    return f"{len(entries)} arguments"
+
+async def ingest_chunks_file(filepath, pool, thinker):
+    source_file = chunk_source_name(os.path.basename(filepath))
+    chunks = chunk_text(await read_file(filepath, errors='ignore'))
+    now = datetime.now()
+    await copy_records(pool, 'text_chunks', ['thinker', 'source_file', 'chunk_text', 'chunk_index', 'created_at'],
+                       [(thinker, source_file, c, i, now) for i, c in enumerate(chunks)])
+    return f"{len(chunks)} chunks"
+
+async def iter_work_copy_row(filepath, thinker, title, source_file, created_at):
+    """Async counterpart of ingest.iter_work_copy_row, yielding UTF-8 bytes"""
+    yield f"{copy_field(thinker)}\t{copy_field(title)}\t{copy_field(source_file)}\t".encode('utf-8')
+    async with aiofiles.open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            block = await f.read(STREAM_READ_SIZE)
+            if not block:
+                break
+            yield copy_field(block).encode('utf-8')
+    yield f"\t{copy_field(created_at)}\n".encode('utf-8')
+
+async def ingest_works_file(filepath, pool, thinker):
+    filename = os.path.basename(filepath)
+    title = work_title(filename)
+    columns = ['thinker', 'title', 'source_file', 'content', 'created_at']
+    now = datetime.now()
+
+    if os.path.getsize(filepath) > WORKS_STREAM_THRESHOLD:
+        # Same bound as ingest.py: stream very large works through COPY in
+        # STREAM_READ_SIZE pieces instead of reading them whole
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.copy_to_table('texts', columns=columns, format='text',
+                                         source=iter_work_copy_row(filepath, thinker, title, filename, now))
+    else:
+        content = await read_file(filepath, errors='ignore')
+        await copy_records(pool, 'texts', columns, [(thinker, title, filename, content, now)])
+    return f"work '{title}'"
+
+INGESTERS = {
+    'positions': ingest_positions_file,
+    'quotes': ingest_quotes_file,
+    'works': ingest_works_file,
+    'arguments': ingest_arguments_file,
+    'chunks': ingest_chunks_file,
+}
+
+async def ingest_one(filepath, pool, semaphore):
+    filename = os.path.basename(filepath)
+    async with semaphore:
+        try:
+            summary = await INGESTERS[get_file_type(filename)](filepath, pool, parse_filename(filename))
+        except Exception as e:
+            print(f"ERROR ({filename}): {e}")
+            return
+    os.remove(filepath)
+    print(f"{filename}: inserted {summary}, deleted file")
+
+async def main():
+    if not os.path.exists(INGEST_FOLDER):
+        print(f"Creating ingest folder: {INGEST_FOLDER}")
+        os.makedirs(INGEST_FOLDER)
+        print("Drop files here and run this script again.")
+        return
+
+    with os.scandir(INGEST_FOLDER) as it:
+        filepaths = [e.path for e in it if e.is_file() and '_' in e.name]
+    if not filepaths:
+        print(f"No files found in {INGEST_FOLDER}")
+        return
+
+    print(f"Found {len(filepaths)} file(s) to process.\n")
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise Exception("DATABASE_URL not found in environment variables")
+
+    semaphore = asyncio.Semaphore(INGEST_WORKERS)
+    # Same tradeoff as ingest.get_ingest_connection(). Sent as a startup
+    # parameter, so the RESET ALL asyncpg runs on release falls back to it
+    async with asyncpg.create_pool(database_url, min_size=1, max_size=INGEST_WORKERS,
+                                   server_settings={'synchronous_commit': 'off'}) as pool:
+        await asyncio.gather(*[ingest_one(p, pool, semaphore) for p in filepaths])
+
+    print("\nDone.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,9 @@
+from setuptools import setup
+from Cython.Build import cythonize
+
+# Optional compiled parsers for ingest.py. Build in place with:
+#   python setup.py build_ext --inplace
+setup(
+    name="ingest-parse",
+    ext_modules=cythonize("_ingest_parse.pyx"),
+)
@@ -0,0 +1,165 @@
+import json
+import random
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+import psycopg2.errors
+import ingest
+from ingest import extract_arguments, extract_pipe_delimited
+
+
+def test_documented_field_order():
+    text = (
+        "### Argument 1 (Deductive)\n"
+        "**Author:** Kant\n"
+        "**Premises:**\n"
+        "- first\n"
+        "- second\n"
+        "**→ Conclusion:** therefore\n\n"
+        "*Source: ethics | Importance: 8/10*\n"
+    )
+    assert extract_arguments(text) == [{
+        'thinker': 'kant',
+        'argument_type': 'deductive',
+        'premises': json.dumps(['first', 'second']),
+        'conclusion': 'therefore',
+        'topic': 'ethics',
+        'importance': 8,
+    }]
+
+
+def test_fields_inside_premises_span():
+    text = (
+        "### Argument 1 (inductive)\n"
+        "**Premises:**\n"
+        "- first\n"
+        "**Author:** Hume\n"
+        "Importance: 7/10\n"
+        "**→ Conclusion:** therefore\n"
+    )
+    [entry] = extract_arguments(text)
+    assert entry['thinker'] == 'hume'
+    assert entry['importance'] == 7
+
+
+def test_importance_after_source_without_pipe():
+    text = (
+        "### Argument 1 (deductive)\n"
+        "**Premises:**\n"
+        "- first\n"
+        "**→ Conclusion:** therefore\n\n"
+        "*Source: ethics*\n"
+        "Importance: 9/10\n"
+    )
+    [entry] = extract_arguments(text)
+    assert entry['importance'] == 9
+
+
+def test_conclusion_before_premises():
+    text = (
+        "### Argument 1 (deductive)\n"
+        "**→ Conclusion:** therefore\n\n"
+        "**Premises:**\n"
+        "- first\n"
+    )
+    [entry] = extract_arguments(text)
+    assert entry['conclusion'] == 'therefore'
+    assert entry['premises'] == json.dumps(['first'])
+
+
+def test_pipe_delimited_ignores_fields_past_topic():
+    assert extract_pipe_delimited("kant | x | ethics | note\n") == [
+        {'thinker': 'kant', 'content': 'x', 'topic': 'ethics'},
+    ]
+
+
+def test_pipe_delimited_form_feed_inside_field():
+    assert extract_pipe_delimited("kant | a\x0cb | t") == [
+        {'thinker': 'kant', 'content': 'a\x0cb', 'topic': 't'},
+    ]
+
+
+def test_compiled_parsers_match_python():
+    compiled = pytest.importorskip("_ingest_parse")
+    rng = random.Random(0)
+    alphabet = ['a', 'é', ' ', '|', ' | ', '\n', '\x0c', '\t', '\u2028']
+    for _ in range(2000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        assert compiled.extract_pipe_delimited(text) == ingest.extract_pipe_delimited_py(text)
+        for chunk_size, overlap in [(7, 2), (5, 0), (1000, 100)]:
+            assert (list(compiled.iter_chunks(text, chunk_size, overlap))
+                    == list(ingest.iter_chunks_py(text, chunk_size, overlap)))
+
+
+class FakeChunksTable:
+    """text_chunks with its UNIQUE(thinker, source_file, chunk_index) key;
+    COPY batches listed in fail_batches raise a non-unique error once"""
+
+    def __init__(self, fail_batches=()):
+        self.rows = set()
+        self.fail_batches = set(fail_batches)
+        self.copies = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        pass
+
+    def copy_expert(self, query, f, size=8192):
+        keys = set()
+        for line in f.read().splitlines():
+            thinker, source_file, _, chunk_index, _ = line.split('\t')
+            keys.add((thinker, source_file, int(chunk_index)))
+        batch = self.table.copies
+        self.table.copies += 1
+        if keys & self.table.rows:
+            raise psycopg2.errors.UniqueViolation("duplicate key value")
+        if batch in self.table.fail_batches:
+            self.table.fail_batches.discard(batch)
+            raise psycopg2.DataError("invalid byte sequence")
+        self.table.rows |= keys
+
+
+def test_chunks_file_partial_failure_then_rerun(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'CHUNK_BATCH_SIZE', 2)
+    filepath = tmp_path / "kant_notes.txt"
+    filepath.write_text("x" * 5000)
+    expected = len(ingest.chunk_text("x" * 5000))
+    table = FakeChunksTable(fail_batches={1})
+
+    ingest.ingest_chunks_file(str(filepath), table, 'kant')
+    assert filepath.exists()
+    assert len(table.rows) == expected - 2
+
+    table.copies = 0
+    ingest.ingest_chunks_file(str(filepath), table, 'kant')
+    assert not filepath.exists()
+    assert len(table.rows) == expected
+
+
+def test_chunks_file_already_ingested_is_deleted(tmp_path):
+    filepath = tmp_path / "kant_notes.txt"
+    filepath.write_text("x" * 5000)
+    table = FakeChunksTable()
+
+    ingest.ingest_chunks_file(str(filepath), table, 'kant')
+    filepath.write_text("x" * 5000)
+    ingest.ingest_chunks_file(str(filepath), table, 'kant')
+    assert not filepath.exists()